@@ -0,0 +1,12 @@
+# app/config.py
+import yaml
+
+try:
+    from yaml import CSafeLoader as _Loader  # libyaml C backend when available
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# Parsed once here; every other module imports CONFIG instead of
+# re-reading and re-parsing config.yaml at its own import time.
+with open("config.yaml", "r", encoding="utf-8") as f:
+    CONFIG = yaml.load(f, Loader=_Loader)
@@ -1,11 +1,12 @@
-import os, json, time, hashlib, asyncio, pathlib, re
-from typing import Dict, Tuple, List
-import yaml
+import os, time, hashlib, asyncio, pathlib, re
+from typing import Dict, Iterator, Tuple, List
+import orjson
+import xxhash
 
+from .config import CONFIG
 from .rag import RAG
 from .web_utils import fetch_page_text
 
-CONFIG = yaml.safe_load(open("config.yaml", "r", encoding="utf-8"))
 ING = CONFIG["ingest"]
 STATE_FILE = os.path.join(ING["root"], ".ingested_state.json")
 
@@ -15,84 +16,166 @@ def _load_state() -> Dict[str, Dict]:
     if not os.path.exists(STATE_FILE):
         return {}
     try:
-        return json.load(open(STATE_FILE, "r", encoding="utf-8"))
+        with open(STATE_FILE, "rb") as f:
+            return orjson.loads(f.read())
     except Exception:
         return {}
 
 def _save_state(state: Dict[str, Dict]):
     os.makedirs(ING["root"], exist_ok=True)
     tmp = STATE_FILE + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2)
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(state))
     os.replace(tmp, STATE_FILE)
 
+def _iter_docs(base: str, exts) -> Iterator[os.DirEntry]:
+    """Yield file entries under base whose extension is in exts.
+
+    Stack-based os.scandir walk instead of os.walk: reuses the file/dir
+    type info DirEntry caches from readdir, so it's ~one syscall per
+    entry instead of two, and entry.path spares the per-file joins.
+    """
+    stack = [base]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and os.path.splitext(entry.name)[1].lower() in exts:
+                        yield entry
+        except OSError:
+            continue
+
+# Change-detection fingerprint only — nothing cryptographic needed, and
+# xxHash3 runs an order of magnitude faster than SHA-1. State entries carry
+# the algo tag so pre-switch fingerprints invalidate cleanly.
+_HASH_ALGO = "xxh3_128"
+
 def _hash_file(path: str) -> str:
-    h = hashlib.sha1()
-    with open(path, "rb") as f:
+    h = xxhash.xxh3_128()
+    # Reusable buffer + readinto: no fresh bytes object per chunk, and
+    # buffering=0 skips the BufferedReader's extra copy on top.
+    buf = bytearray(4 * 1024 * 1024)
+    mv = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
         while True:
-            b = f.read(1024*1024)
-            if not b: break
-            h.update(b)
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(mv[:n])
     return h.hexdigest()
 
 async def _ingest_files_in_dir(rag: RAG, dir_path: str, namespace: str, state: Dict[str, Dict]) -> int:
-    count = 0
-    for root, _, files in os.walk(dir_path):
-        for name in files:
-            p = os.path.join(root, name)
-            ext = os.path.splitext(name)[1].lower()
-            if ext not in DOC_EXTS:
-                continue
-            key = f"file::{namespace}::{os.path.abspath(p)}"
-            sha = _hash_file(p)
-            entry = state.get(key)
-            if entry and entry.get("sha") == sha:
-                continue
-            rag.ingest([p], namespace=namespace)
-            state[key] = {"sha": sha, "ts": time.time()}
-            count += 1
-    return count
+    candidates: List[Tuple[str, str, os.stat_result]] = []
+    for entry in _iter_docs(os.path.abspath(dir_path), DOC_EXTS):
+        p = entry.path
+        key = f"file::{namespace}::{p}"
+        st = entry.stat()
+        prev = state.get(key)
+        # Cheap pre-check: unchanged (mtime, size) means unchanged content,
+        # so skip the full-file hash on the common nothing-changed scan.
+        if prev and prev.get("hash_algo") == _HASH_ALGO and prev.get("mtime_ns") == st.st_mtime_ns and prev.get("size") == st.st_size:
+            continue
+        candidates.append((p, key, st))
+    if not candidates:
+        return 0
+
+    # Hash off the event loop so run_watcher keeps ticking; the semaphore
+    # bounds thread fan-out to keep memory/IO sane.
+    sem = asyncio.Semaphore((os.cpu_count() or 1) * 2)
+
+    async def _hash_one(p: str, key: str, st: os.stat_result):
+        async with sem:
+            return p, key, st, await asyncio.to_thread(_hash_file, p)
+
+    results = await asyncio.gather(*(_hash_one(p, key, st) for p, key, st in candidates))
+    # Merge state serially after the fan-out to avoid concurrent dict writes.
+    changed: List[Tuple[str, str, Dict]] = []
+    for p, key, st, sha in results:
+        entry_state = {"sha": sha, "hash_algo": _HASH_ALGO, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "ts": time.time()}
+        prev = state.get(key)
+        if prev and prev.get("hash_algo") == _HASH_ALGO and prev.get("sha") == sha:
+            entry_state["ts"] = prev.get("ts", entry_state["ts"])
+            state[key] = entry_state
+        else:
+            changed.append((p, key, entry_state))
+    if not changed:
+        return 0
+    # One batched ingest per namespace per scan: Chroma embeds and commits
+    # once instead of per file. State is only committed once it succeeds.
+    await asyncio.to_thread(rag.ingest, [p for p, _, _ in changed], namespace=namespace)
+    for _, key, entry_state in changed:
+        state[key] = entry_state
+    return len(changed)
 
 async def _ingest_links_in_dir(rag: RAG, dir_path: str, namespace: str, state: Dict[str, Dict]) -> int:
-    count = 0
     cache_dir = ING["links_cache_dir"]
     os.makedirs(cache_dir, exist_ok=True)
-    for root, _, files in os.walk(dir_path):
-        for name in files:
-            if not name.lower().endswith(".txt"):
-                continue
-            p = os.path.join(root, name)
-            key_file = f"linksfile::{namespace}::{os.path.abspath(p)}"
-            mtime = os.path.getmtime(p)
-            entry = state.get(key_file)
-            # Reprocess file if modified
-            if not entry or entry.get("mtime") != mtime:
-                # process each line URL
+    pending: List[Tuple[str, str]] = []  # (state key, url)
+    touched_files: List[Tuple[str, float]] = []
+    seen = set()
+    for fentry in _iter_docs(os.path.abspath(dir_path), {".txt"}):
+        p = fentry.path
+        key_file = f"linksfile::{namespace}::{p}"
+        mtime = os.path.getmtime(p)
+        entry = state.get(key_file)
+        # Reprocess file if modified
+        if not entry or entry.get("mtime") != mtime:
+            # collect each line URL
+            try:
+                urls = [ln.strip() for ln in open(p, "r", encoding="utf-8").read().splitlines() if ln.strip()]
+            except Exception:
+                urls = []
+            for u in urls:
+                if not re.match(r"^https?://", u):
+                    continue
+                key = f"url::{namespace}::{u}"
+                if key in seen or (key in state and state[key].get("ok")):
+                    continue
+                seen.add(key)
+                pending.append((key, u))
+            touched_files.append((key_file, mtime))
+
+    # The fetches are independent network requests; fire them concurrently
+    # with a cap instead of paying each round-trip back to back.
+    results = []
+    if pending:
+        sem = asyncio.Semaphore(8)
+
+        async def _fetch_one(key: str, u: str):
+            async with sem:
                 try:
-                    urls = [ln.strip() for ln in open(p, "r", encoding="utf-8").read().splitlines() if ln.strip()]
-                except Exception:
-                    urls = []
-                for u in urls:
-                    if not re.match(r"^https?://", u): 
-                        continue
-                    key = f"url::{namespace}::{u}"
-                    if key in state and state[key].get("ok"):
-                        continue
-                    try:
-                        text = await fetch_page_text(u)
-                        sha = hashlib.sha1(u.encode()).hexdigest()
-                        cache_path = os.path.join(cache_dir, f"{sha}.txt")
-                        open(cache_path, "w", encoding="utf-8").write(text)
-                        rag.ingest([cache_path], namespace=namespace)
-                        state[key] = {"ok": True, "ts": time.time(), "cache": cache_path}
-                        count += 1
-                    except Exception as e:
-                        state[key] = {"ok": False, "error": str(e), "ts": time.time()}
-                state[key_file] = {"mtime": mtime, "ts": time.time()}
+                    return key, u, await fetch_page_text(u), None
+                except Exception as e:
+                    return key, u, None, str(e)
+
+        results = await asyncio.gather(*(_fetch_one(key, u) for key, u in pending))
+
+    count = 0
+    fetched: List[Tuple[str, str]] = []  # (state key, cache path)
+    for key, u, text, err in results:
+        if text is None:
+            state[key] = {"ok": False, "error": err, "ts": time.time()}
+            continue
+        sha = hashlib.sha1(u.encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{sha}.txt")
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        fetched.append((key, cache_path))
+    if fetched:
+        await asyncio.to_thread(rag.ingest, [cp for _, cp in fetched], namespace=namespace)
+        for key, cache_path in fetched:
+            state[key] = {"ok": True, "ts": time.time(), "cache": cache_path}
+            count += 1
+    for key_file, mtime in touched_files:
+        state[key_file] = {"mtime": mtime, "ts": time.time()}
     return count
 
 async def scan_all(rag: RAG) -> Dict[str, int]:
     state = _load_state()
+    before = dict(state)  # entries are replaced wholesale, so a shallow snapshot suffices
     totals = {"docs":0, "links":0}
     uploads_dir = ING["uploads_dir"]
     links_dir = ING["links_dir"]
@@ -119,7 +202,9 @@ async def scan_all(rag: RAG) -> Dict[str, int]:
     for dir_path, ns in ns_dirs(links_dir):
         totals["links"] += await _ingest_links_in_dir(rag, dir_path, ns, state)
 
-    _save_state(state)
+    # Don't rewrite the state file on idle scans where nothing changed.
+    if state != before:
+        _save_state(state)
     return totals
 
 async def run_watcher(rag: RAG, interval: int):
@@ -1,7 +1,23 @@
-import httpx, yaml
-from typing import Dict, Any
+import httpx
+from typing import Dict, Any, Optional
 
-CONFIG = yaml.safe_load(open("config.yaml", "r", encoding="utf-8"))
+from .config import CONFIG
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _client() -> httpx.AsyncClient:
+    # Lazy so the pool is created on the running event loop; reused across
+    # calls to keep TCP connections to the Ollama server alive.
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(timeout=180, limits=httpx.Limits(max_keepalive_connections=8))
+    return _CLIENT
+
+async def aclose_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
 
 async def call_llm(tier: str, prompt: Dict[str, str]) -> str:
     model = CONFIG["llm"]["tier1_model"] if tier=="tier1" else CONFIG["llm"]["tier2_model"]
@@ -14,13 +30,12 @@ async def _ollama_chat(model: str, prompt: Dict[str, str], max_tokens: int) -> s
         {"role": "system", "content": prompt["system"]},
         {"role": "user", "content": prompt["user"]},
     ]
-    async with httpx.AsyncClient(timeout=180) as client:
-        r = await client.post(url, json={
-            "model": model,
-            "messages": messages,
-            "stream": False,
-            "options": {"num_predict": max_tokens, "temperature": 0.2}
-        })
-        r.raise_for_status()
-        data = r.json()
-        return data.get("message", {}).get("content", "") or str(data)
+    r = await _client().post(url, json={
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        "options": {"num_predict": max_tokens, "temperature": 0.2}
+    })
+    r.raise_for_status()
+    data = r.json()
+    return data.get("message", {}).get("content", "") or str(data)
@@ -2,7 +2,7 @@ from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pydantic import BaseModel
 from typing import List, Optional, Iterable, Tuple
-import os, tempfile, asyncio, yaml, sys
+import os, tempfile, asyncio, sys
 from pathlib import Path
 
 # --- FS SAFETY GUARDS (skip systemd-private and Proton z:; don't follow symlinks) ---
@@ -111,14 +111,15 @@ _Path_rglob_original = Path.rglob
 Path.rglob = _safe_rglob  # type: ignore[assignment]
 # --- END FS SAFETY GUARDS ---
 
+from .config import CONFIG
 from .orchestrator import Orchestrator
 from .rag import RAG
-from .web_utils import fetch_page_text
+from .web_utils import fetch_page_text, aclose_client as _close_web_client
+from .llm_providers import aclose_client as _close_llm_client
 from .ingest_watcher import run_watcher, scan_all
 from fastapi.middleware.cors import CORSMiddleware
 
 
-CONFIG = yaml.safe_load(open("config.yaml", "r", encoding="utf-8"))
 ING = CONFIG["ingest"]
 
 app = FastAPI(title="Customer Service AI — Local (Ollama)")
@@ -155,6 +156,8 @@ async def _shutdown():
             await bg_task
         except asyncio.CancelledError:
             pass
+    await _close_llm_client()
+    await _close_web_client()
 
 # ---------- Schemas ----------
 class ChatIn(BaseModel):
@@ -1,9 +1,10 @@
 # app/orchestrator.py
 import re
-import json
-import yaml
+import orjson
+from collections import OrderedDict
 from typing import Optional, Dict, Any, List
 
+from .config import CONFIG
 from .llm_providers import call_llm
 from .web_tools import web_answer
 from .prompts import (
@@ -13,10 +14,32 @@ from .prompts import (
     TIER2_USER_TEMPLATE,
 )
 
-CONFIG = yaml.safe_load(open("config.yaml", "r", encoding="utf-8"))
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+_CLOSING_PATTERNS = [
+    r"^thanks[.!]?$", r"^thank you[.!]?$", r"^thx[.!]?$", r"^ty[.!]?$",
+    r"^ok(ay)?[.!]?$", r"^got it[.!]?$", r"^cool[.!]?$", r"^bye[.!]?$",
+    r"^goodbye[.!]?$", r"^see you[.!]?$",
+]
 
 def _strip_think_blocks(text: str) -> str:
-    return re.sub(r"<think>.*?</think>", "", text or "", flags=re.DOTALL).strip()
+    return _THINK_RE.sub("", text or "").strip()
+
+class _LRU(OrderedDict):
+    """Capped dict; the least-recently-touched entry evicts first."""
+
+    def __init__(self, cap: int):
+        super().__init__()
+        self.cap = cap
+
+    def touch(self, key, default):
+        if key in self:
+            self.move_to_end(key)
+        else:
+            self[key] = default
+            if len(self) > self.cap:
+                self.popitem(last=False)
+        return self[key]
 
 class Orchestrator:
     """
@@ -31,14 +54,52 @@ class Orchestrator:
         self.policy = CONFIG["policy"]
         self.features = CONFIG.get("features", {})
         self.cooldown_turns = int(self.features.get("tier2_cooldown_turns", 2))
-        self._session_meta: Dict[str, Dict[str, int]] = {}  # {user_id: {"turn": int, "last_tier2_turn": -999}}
+        # Caps on how much retrieved text goes into the prompts; LLM cost
+        # scales with prompt tokens. Matches web_tools' 1200-char snippets.
+        self.max_doc_chars = int(self.policy.get("max_doc_chars", 1200))
+        self.max_context_chars = int(self.policy.get("max_context_chars", 0))  # 0 = uncapped
+        # {user_id: {"turn": int, "last_tier2_turn": -999}}, bounded so a
+        # long-running server doesn't grow session metadata forever.
+        self._session_meta = _LRU(int(self.features.get("max_tracked_sessions", 50_000)))
+        # Compile policy patterns once; these run on every incoming message.
+        self._fresh_re = [re.compile(rx) for rx in self.policy.get("needs_freshness_patterns", [])]
+        self._intent_re = [re.compile(rx) for rx in self.policy.get("reasoning_intent_patterns", [])]
+        self._closing_re = [re.compile(p) for p in _CLOSING_PATTERNS]
+        self._trivial_re = re.compile(
+            r"^(?:hi|hey|hello|hi there|hey there|yo|sup|hiya|hola|good (?:morning|afternoon|evening))[.!]?$",
+            re.IGNORECASE,
+        )
 
     async def handle_chat(self, user_id: str, message: str, namespace: Optional[str] = None) -> Dict[str, Any]:
         turn = self._bump_turn(user_id)
 
+        # 0) Greetings/thanks/closings get a canned reply up front; no
+        #    reason to pay for retrieval or a Tier-1 call on "hi".
+        if self._is_trivial_smalltalk(message) or self._is_gratitude_or_closing(message):
+            return {
+                "tier": "tier1",
+                "answer": self._canned(message),
+                "citations": [],
+                "difficulty_report": {"escalated": False, "reasons": ["smalltalk"]},
+            }
+
+        # 0.5) Freshness / reasoning-intent cues force Tier-2 outside the
+        #      cooldown anyway, so skip the retrieval + Tier-1 round-trip.
+        fresh = self._looks_fresh(message) if self.features.get("tier2_on_freshness", True) else False
+        intent_reason = self._looks_reasoning_intent(message) if self.features.get("tier2_on_reasoning_intent", True) else False
+        if (fresh or intent_reason) and not self._within_tier2_cooldown(user_id, turn, self.cooldown_turns):
+            difficulty = {
+                "avg_retrieval_similarity": 0.0,
+                "tier1_confidence": 0.0,
+                "reasons": sorted(set(["tier1_skipped"] + (["freshness"] if fresh else []) + (["reasoning_intent"] if intent_reason else []))),
+            }
+            return await self._escalate(user_id, turn, message, "", [], difficulty, fresh)
+
         # 1) Retrieve internal context
         docs = self.rag.retrieve(message, top_k=self.policy["top_k"], namespace=namespace)
-        context_text = "\n\n".join([f"[{d['source']}] {d['text']}" for d in docs])
+        context_text = "\n\n".join(f"[{d['source']}] {d['text'][:self.max_doc_chars]}" for d in docs)
+        if self.max_context_chars:
+            context_text = context_text[:self.max_context_chars]
         sims = [d.get("score", 0.0) for d in docs]
         avg_sim = sum(sims) / len(sims) if sims else 0.0
 
@@ -52,10 +113,6 @@ class Orchestrator:
         conf = float(t1_json.get("confidence", 0.0) or 0.0)
 
         # 3) Decide escalation
-        # Never escalate for greetings/thanks/closings
-        if self._is_trivial_smalltalk(message) or self._is_gratitude_or_closing(message):
-            return self._t1_response(t1_json, docs)
-
         reasons: List[str] = []
         # Weak T1 signals
         if avg_sim < self.policy["min_similarity"]:
@@ -65,45 +122,39 @@ class Orchestrator:
         if bool(t1_json.get("needs_web", False)):
             reasons.append("tier1_requested_web")
 
-        # Cues
-        fresh = self._looks_fresh(message) if self.features.get("tier2_on_freshness", True) else False
-        intent_reason = self._looks_reasoning_intent(message) if self.features.get("tier2_on_reasoning_intent", True) else False
-
-        # Cool-down: if within cooldown, be stricter (require strong cue + not purely trivial)
+        # Cool-down: if within cooldown, be stricter (require strong cue + weak T1);
+        # outside it, freshness/reasoning intent already escalated up front.
+        weak_t1 = ("low_retrieval" in " ".join(reasons)) or ("low_confidence" in " ".join(reasons)) or ("tier1_requested_web" in reasons)
         if self._within_tier2_cooldown(user_id, turn, self.cooldown_turns):
-            # only escalate if freshness OR reasoning intent AND (weak T1)
-            weak_t1 = ("low_retrieval" in " ".join(reasons)) or ("low_confidence" in " ".join(reasons)) or ("tier1_requested_web" in reasons)
             should_escalate = (fresh or intent_reason) and weak_t1
         else:
-            # OUTSIDE cooldown:
-            # Escalate if:
-            #   - freshness OR reasoning intent (regardless of T1 confidence), OR
-            #   - weak T1 (low retrieval/confidence)
-            weak_t1 = ("low_retrieval" in " ".join(reasons)) or ("low_confidence" in " ".join(reasons)) or ("tier1_requested_web" in reasons)
-            should_escalate = fresh or intent_reason or weak_t1
+            should_escalate = weak_t1
 
         if not should_escalate:
             return self._t1_response(t1_json, docs)
 
-        # 4) Tier-2 reasoning (web disabled unless features.use_web true)
-        needs_web = bool(self.features.get("use_web", False)) and fresh
-        web_ctx, web_citations = ("", [])
-        if needs_web:
-            web_ctx, web_citations = await web_answer(message)  # bulletproof
-
         difficulty = {
             "avg_retrieval_similarity": avg_sim,
             "tier1_confidence": conf,
             "reasons": sorted(set(reasons + (["freshness"] if fresh else []) + (["reasoning_intent"] if intent_reason else []))),
-            "needs_web": needs_web,
         }
+        return await self._escalate(user_id, turn, message, context_text, docs, difficulty, fresh)
+
+    async def _escalate(self, user_id: str, turn: int, message: str, context_text: str,
+                        docs: List[Dict[str, Any]], difficulty: Dict[str, Any], fresh: bool) -> Dict[str, Any]:
+        # Tier-2 reasoning (web disabled unless features.use_web true)
+        needs_web = bool(self.features.get("use_web", False)) and fresh
+        web_ctx, web_citations = ("", [])
+        if needs_web:
+            web_ctx, web_citations = await web_answer(message)  # bulletproof
+        difficulty["needs_web"] = needs_web
 
         t2_prompt = {
             "system": TIER2_SYSTEM,
             "user": TIER2_USER_TEMPLATE.format(
                 user_message=message,
                 retrieved_context=context_text,
-                difficulty_report=json.dumps(difficulty),
+                difficulty_report=orjson.dumps(difficulty).decode(),
                 web_context=web_ctx,
             ),
         }
@@ -134,7 +185,7 @@ class Orchestrator:
 
     def _parse_tier1_json(self, t1_raw: str) -> Dict[str, Any]:
         try:
-            data = json.loads(t1_raw)
+            data = orjson.loads(t1_raw)
             if not isinstance(data, dict):
                 raise ValueError("Tier-1 did not return a JSON object.")
             data.setdefault("answer", "")
@@ -146,37 +197,33 @@ class Orchestrator:
             return {"answer": (t1_raw or "").strip() or "I'm not fully sure.", "confidence": 0.0, "needs_web": False, "reasons": ["unparseable self-report"]}
 
     def _looks_fresh(self, message: str) -> bool:
-        for rx in self.policy.get("needs_freshness_patterns", []):
-            if re.search(rx, message):
-                return True
-        return False
+        return any(rx.search(message) for rx in self._fresh_re)
 
     def _looks_reasoning_intent(self, message: str) -> bool:
-        for rx in self.policy.get("reasoning_intent_patterns", []):
-            if re.search(rx, message):
-                return True
-        return False
+        return any(rx.search(message) for rx in self._intent_re)
 
     def _is_trivial_smalltalk(self, message: str) -> bool:
-        m = message.strip().lower()
-        common = {"hi", "hey", "hello", "hi there", "hey there", "yo", "sup", "hiya", "hola", "good morning", "good afternoon", "good evening"}
-        return (len(m) <= 20 and m in common)
+        return bool(self._trivial_re.match(message.strip()))
 
     def _is_gratitude_or_closing(self, message: str) -> bool:
         m = message.strip().lower()
-        patterns = [r"^thanks[.!]?$", r"^thank you[.!]?$", r"^thx[.!]?$", r"^ty[.!]?$", r"^ok(ay)?[.!]?$", r"^got it[.!]?$", r"^cool[.!]?$", r"^bye[.!]?$", r"^goodbye[.!]?$", r"^see you[.!]?$"]
-        return any(re.match(p, m) for p in patterns)
+        return any(rx.match(m) for rx in self._closing_re)
+
+    def _canned(self, message: str) -> str:
+        if self._is_trivial_smalltalk(message):
+            return "Hi! How can I help you today?"
+        return "You're welcome! If anything else comes up, just ask."
 
     def _bump_turn(self, user_id: str) -> int:
-        meta = self._session_meta.setdefault(user_id, {"turn": 0, "last_tier2_turn": -999})
+        meta = self._session_meta.touch(user_id, {"turn": 0, "last_tier2_turn": -999})
         meta["turn"] += 1
         return meta["turn"]
 
     def _mark_tier2(self, user_id: str, turn: int):
-        self._session_meta.setdefault(user_id, {"turn": 0, "last_tier2_turn": -999})
-        self._session_meta[user_id]["last_tier2_turn"] = turn
+        meta = self._session_meta.touch(user_id, {"turn": 0, "last_tier2_turn": -999})
+        meta["last_tier2_turn"] = turn
 
     def _within_tier2_cooldown(self, user_id: str, turn: int, cooldown_turns: int) -> bool:
-        meta = self._session_meta.setdefault(user_id, {"turn": 0, "last_tier2_turn": -999})
+        meta = self._session_meta.touch(user_id, {"turn": 0, "last_tier2_turn": -999})
         last_t2 = meta.get("last_tier2_turn", -999)
         return (turn - last_t2) <= cooldown_turns
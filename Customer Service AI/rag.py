@@ -1,20 +1,80 @@
-import os, re, hashlib
+import os, re, hashlib, shelve, threading
 from typing import List, Optional, Dict, Any
+import numpy as np
 import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from sentence_transformers import SentenceTransformer
 
+try:
+    import pypdfium2 as pdfium  # PDFium bindings, much faster than pure-Python pypdf
+except ImportError:
+    pdfium = None
 from pypdf import PdfReader
 import docx
 import markdown
-from bs4 import BeautifulSoup
 
-EMB = SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+from .web_utils import html_to_text
+
+class _OnnxMiniLM:
+    """all-MiniLM-L6-v2 exported to ONNX with dynamic int8 quantization.
+
+    2-4x CPU throughput over the FP32 SentenceTransformer (int8 matmuls
+    hit VNNI dot-product instructions where available) with negligible
+    retrieval-quality loss on short passages. Exposes the same encode()
+    surface RAG uses on SentenceTransformer.
+    """
+
+    _MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+    def __init__(self, cache_dir: str = "./onnx-minilm"):
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        if not os.path.exists(os.path.join(cache_dir, "model_quantized.onnx")):
+            model = ORTModelForFeatureExtraction.from_pretrained(self._MODEL_ID, export=True)
+            model.save_pretrained(cache_dir)
+            quantizer = ORTQuantizer.from_pretrained(cache_dir)
+            quantizer.quantize(save_dir=cache_dir,
+                               quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False))
+        self.tokenizer = AutoTokenizer.from_pretrained(self._MODEL_ID)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(cache_dir, file_name="model_quantized.onnx")
+
+    def encode(self, texts: List[str], batch_size: int = 64,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = True):
+        outs = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[i:i+batch_size], padding=True, truncation=True,
+                                 max_length=256, return_tensors="np")
+            hidden = np.asarray(self.model(**enc).last_hidden_state)
+            # Mean pooling over non-padding tokens, as the ST model does.
+            mask = np.asarray(enc["attention_mask"])[..., None].astype(hidden.dtype)
+            outs.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        embs = np.concatenate(outs) if outs else np.empty((0, 384), dtype=np.float32)
+        if normalize_embeddings:
+            embs = embs / np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+        return embs
+
+def _load_encoder():
+    try:
+        return _OnnxMiniLM()
+    except Exception:
+        # optimum/onnxruntime not installed (or export failed): fall back
+        # to the FP32 SentenceTransformer.
+        return SentenceTransformer("all-MiniLM-L6-v2")
+
+def _pdf_text(path: str) -> str:
+    if pdfium is not None:
+        doc = pdfium.PdfDocument(path)
+        try:
+            return "\n".join(page.get_textpage().get_text_range() for page in doc)
+        finally:
+            doc.close()
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
 
 def _file_to_text(path: str) -> str:
     ext = os.path.splitext(path)[1].lower()
     if ext == ".pdf":
-        reader = PdfReader(path)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
+        return _pdf_text(path)
     if ext in [".txt", ".md"]:
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
             return f.read()
@@ -22,51 +82,94 @@ def _file_to_text(path: str) -> str:
         d = docx.Document(path)
         return "\n".join(p.text for p in d.paragraphs)
     if ext in [".html", ".htm"]:
-        html = open(path, "r", encoding="utf-8", errors="ignore").read()
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text(" ")
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return html_to_text(f.read())
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
 def _chunk(text: str, size: int = 800, overlap: int = 120) -> List[str]:
-    words = re.split(r"\s+", text)
+    # Word-start offsets into the original string; slicing text directly
+    # avoids materializing every token plus a join per chunk.
+    boundaries = [0] + [m.end() for m in re.finditer(r"\s+", text)]
+    boundaries.append(len(text))
+    n = len(boundaries) - 1
     chunks, i = [], 0
-    while i < len(words):
-        chunk = " ".join(words[i:i+size])
-        chunks.append(chunk.strip())
+    while i < n:
+        ch = text[boundaries[i]:boundaries[min(i + size, n)]].strip()
+        if ch:
+            chunks.append(ch)
         i += size - overlap
-    return [c for c in chunks if c]
+    return chunks
 
 class RAG:
     def __init__(self, persist_dir: str = "./chroma"):
         self.client = chromadb.PersistentClient(path=persist_dir)
+        # Embed ourselves rather than through Chroma's per-add embedding
+        # function, so chunks go through the model in real batches.
+        self.model = _load_encoder()
+        # Content-addressed cache (text sha -> chunks + embeddings) so the
+        # same document dropped into several namespaces embeds only once.
+        # ingest runs in worker threads (and scans can overlap), and shelve
+        # isn't safe for concurrent access, so all cache touches hold the lock.
+        self._emb_cache = shelve.open(os.path.join(persist_dir, "emb_cache"))
+        self._emb_cache_lock = threading.Lock()
 
     def _collection(self, namespace: Optional[str] = None):
         name = f"kb_{(namespace or 'default')}"
-        return self.client.get_or_create_collection(
-            name=name, embedding_function=EMB
-        )
+        return self.client.get_or_create_collection(name=name)
+
+    def _embed(self, texts: List[str]):
+        return self.model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
 
     def ingest(self, paths: List[str], namespace: Optional[str] = None) -> int:
         col = self._collection(namespace)
-        total = 0
+        ids, docs, metas = [], [], []
+        rows = []     # per row: a cached embedding, or a (sha, chunk idx) placeholder
+        pending = {}  # text sha -> chunks still needing embedding (unique content)
         for p in paths:
             text = _file_to_text(p)
-            for idx, ch in enumerate(_chunk(text)):
-                uid = hashlib.sha1(f"{p}::{idx}".encode()).hexdigest()
-                col.add(ids=[uid], documents=[ch], metadatas=[{"source": os.path.basename(p)}])
-                total += 1
-        return total
+            sha = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            with self._emb_cache_lock:
+                cached = self._emb_cache.get(sha)
+            if cached is not None:
+                chunks, embs = cached
+            else:
+                chunks, embs = _chunk(text), None
+                pending[sha] = chunks
+            source = os.path.basename(p)
+            for idx, ch in enumerate(chunks):
+                ids.append(hashlib.sha1(f"{p}::{idx}".encode()).hexdigest())
+                docs.append(ch)
+                metas.append({"source": source})
+                rows.append(embs[idx] if embs is not None else (sha, idx))
+        # One add per batch: one embedding pass over cache misses and one
+        # Chroma transaction instead of a model call + commit per chunk.
+        if pending:
+            flat = [ch for chunks in pending.values() for ch in chunks]
+            enc = self._embed(flat).tolist()
+            pos = 0
+            fresh = {}
+            with self._emb_cache_lock:
+                for sha, chunks in pending.items():
+                    fresh[sha] = enc[pos:pos + len(chunks)]
+                    self._emb_cache[sha] = (chunks, fresh[sha])
+                    pos += len(chunks)
+                self._emb_cache.sync()
+            rows = [fresh[r[0]][r[1]] if isinstance(r, tuple) else r for r in rows]
+        if ids:
+            col.add(ids=ids, documents=docs, metadatas=metas, embeddings=rows)
+        return len(ids)
 
     def retrieve(self, query: str, top_k: int = 5, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
         col = self._collection(namespace)
-        res = col.query(query_texts=[query], n_results=top_k, include=["documents", "metadatas", "distances"])
+        q_emb = self._embed([query])
+        res = col.query(query_embeddings=q_emb.tolist(), n_results=top_k, include=["documents", "metadatas", "distances"])
         docs = []
         if res and res.get("documents"):
             docs_raw = res["documents"][0]
             metas = res["metadatas"][0]
-            dists = res.get("distances", [[0]*len(docs_raw)])[0]
-            sims = [1/(1+d) for d in dists]
+            dists = np.asarray(res.get("distances", [[0]*len(docs_raw)])[0], dtype=np.float32)
+            sims = (1.0 / (1.0 + dists)).tolist()
             for ch, meta, sim in zip(docs_raw, metas, sims):
                 docs.append({"text": ch, "source": meta.get("source", "kb"), "score": sim})
         return docs
@@ -1,9 +1,10 @@
 # app/web_tools.py
-import httpx
-from bs4 import BeautifulSoup
+import asyncio
 from duckduckgo_search import DDGS
 from typing import Tuple, List
 
+from .web_utils import client, html_to_text
+
 async def web_answer(query: str) -> Tuple[str, List[str]]:
     """
     Try to fetch a couple of snippets for a query.
@@ -23,17 +24,15 @@ async def web_answer(query: str) -> Tuple[str, List[str]]:
             return "", []
 
         contexts, citations = [], []
-        async with httpx.AsyncClient(timeout=15) as client:
-            for u in urls:
-                try:
-                    resp = await client.get(u, follow_redirects=True, headers={"User-Agent": "Mozilla/5.0"})
-                    soup = BeautifulSoup(resp.text, "html.parser")
-                    text = soup.get_text(" ", strip=True)
-                    if text:
-                        contexts.append(text[:1200])
-                        citations.append(u)
-                except Exception:
-                    continue
+        for u in urls:
+            try:
+                resp = await client().get(u, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
+                text = await asyncio.to_thread(html_to_text, resp.text)
+                if text:
+                    contexts.append(text[:1200])
+                    citations.append(u)
+            except Exception:
+                continue
 
         return ("\n\n".join(contexts), citations) if contexts else ("", [])
     except Exception:
@@ -1,10 +1,34 @@
+import asyncio
+from typing import Optional
+
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Parse only text-bearing elements; script/style/nav/footer subtrees are
+# skipped at parse time instead of filtered afterwards.
+_STRAIN = SoupStrainer(["p", "li", "h1", "h2", "h3", "h4", "article", "section", "main", "td"])
+
+def html_to_text(html: str) -> str:
+    return BeautifulSoup(html, "lxml", parse_only=_STRAIN).get_text(" ", strip=True)
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+def client() -> httpx.AsyncClient:
+    # Lazy shared client: keeps connection pools and TLS sessions warm
+    # across fetches instead of tearing them down per call.
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(follow_redirects=True, limits=httpx.Limits(max_keepalive_connections=8))
+    return _CLIENT
+
+async def aclose_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
 
 async def fetch_page_text(url: str, timeout: int = 25) -> str:
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        r = await client.get(url, headers={"User-Agent":"Mozilla/5.0"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        # Keep basic text; caller can pass it to RAG
-        return soup.get_text(" ", strip=True)
+    r = await client().get(url, headers={"User-Agent":"Mozilla/5.0"}, timeout=timeout)
+    r.raise_for_status()
+    # Parsing a large page is multi-ms of CPU; keep it off the event loop.
+    return await asyncio.to_thread(html_to_text, r.text)